@@ -8,9 +8,26 @@ import re
 import subprocess
 import csv
 import io
+import hashlib
+import base64
+import time
+import shutil
+import html
+import string
+import gzip
+import urllib.request
+import urllib.parse
+import glob
+import fnmatch
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from shutil import rmtree
 from typing import Dict, List, Tuple, Union, Any, Callable
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 
 class Util:
 
@@ -76,6 +93,14 @@ class Util:
     @staticmethod
     def only_hashtags(x     )        : return len(x) == x.count("#")
 
+    @staticmethod
+    def file_hash(path):
+        h = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(65536), b""):
+                h.update(chunk)
+        return h.hexdigest()
+
     @staticmethod
     def split_list(l           , p     )                               :
         return [x[1:] for x in l if x.startswith(p)], [x for x in l if not x.startswith(p)]
@@ -96,6 +121,225 @@ class Util:
         return key
 
 
+class Journal:
+    # records the files created, modified or deleted by each action of the run
+    # every writer calls watch() before touching a file, the final state is compared at the end
+    MANIFEST = Util.join([".indexer", "changes.json"])
+    action = "init"
+    original                                = {}
+
+    @staticmethod
+    def start():
+        Journal.action = "init"
+        Journal.original = {}
+
+    @staticmethod
+    def watch(path     ):
+        path = Util.normpath(path)
+        if path not in Journal.original:
+            sha1 = Util.file_hash(path) if os.path.isfile(path) else None
+            Journal.original[path] = (Journal.action, sha1)
+
+    @staticmethod
+    def watch_tree(path     ):
+        for (root, _dirs, files) in os.walk(path):
+            for file in files:
+                Journal.watch(Util.join([root, file]))
+
+    # after an external writer: files of the tree not seen by watch_tree before didn't exist
+    @staticmethod
+    def watch_new(path     ):
+        for (root, _dirs, files) in os.walk(path):
+            for file in files:
+                file = Util.join([root, file])
+                if file not in Journal.original:
+                    Journal.original[file] = (Journal.action, None)
+
+    @staticmethod
+    def get_changes()                        :
+        changes = []
+        for path, (action, old) in sorted(Journal.original.items()):
+            new = Util.file_hash(path) if os.path.isfile(path) else None
+            if old == new:
+                continue
+            status = "created" if old is None else "deleted" if new is None else "modified"
+            changes.append({"path": path, "status": status, "sha1": new, "action": action})
+        return changes
+
+    @staticmethod
+    def save(path     ):
+        changes = Journal.get_changes()
+        Util.create_dirs_if_needed(path)
+        with open(path, "w") as f:
+            f.write(json.dumps({"files": changes}, indent=2))
+        print("  " + str(len(changes)) + " changed files listed in " + path)
+
+
+class Cache:
+    # content addressed store shared between builds and projects
+    # files are written to a temp name and renamed, so concurrent processes can share the dir
+    def __init__(self, root     ):
+        self.root = os.path.abspath(root)
+        if not os.path.isdir(self.root):
+            os.makedirs(self.root, exist_ok=True)
+
+    def __path(self, key     )       :
+        return Util.join([self.root, key[:2], key])
+
+    def get_file(self, key     , dest     )        :
+        path = self.__path(key)
+        if not os.path.isfile(path):
+            return False
+        Util.create_dirs_if_needed(dest)
+        shutil.copyfile(path, dest)
+        return True
+
+    def put_file(self, key     , src     ):
+        if not os.path.isfile(src):
+            return
+        path = self.__path(key)
+        Util.create_dirs_if_needed(path)
+        tmp = path + "." + str(os.getpid()) + ".tmp"
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, path)
+
+    def get_json(self, key     ):
+        path = self.__path(key) + ".json"
+        if not os.path.isfile(path):
+            return None
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def put_json(self, key     , data):
+        path = self.__path(key) + ".json"
+        Util.create_dirs_if_needed(path)
+        tmp = path + "." + str(os.getpid()) + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(json.dumps(data))
+        os.replace(tmp, path)
+
+
+class Changes:
+    # decides if an output is outdated by its source
+    # default: comparing mtimes, with git: files changed since the last build
+    # .indexer/last_build: {"commit": "<HEAD>", "dirty": {"base/01/Readme.md": "<sha1 or null>"}}
+    # dirty keeps the files built from the working tree, different from the commit
+    LAST_BUILD = Util.join([".indexer", "last_build"])
+    GLOBAL_FILES = [".categories.csv", ".symbols.json"]  # feed every post
+
+    def __init__(self, rebuild_all       = False, base                  = None):
+        self.rebuild_all = rebuild_all
+        self.base = base
+        self.incremental = False  # True when the changed set is known, so untouched outputs can be kept
+        self.files = None
+
+    @staticmethod
+    def git(cmd           )                 :
+        try:
+            result = subprocess.run(["git", "-c", "core.quotepath=off"] + cmd, stdout=subprocess.PIPE,
+                                    stderr=subprocess.DEVNULL, universal_newlines=True)
+        except FileNotFoundError:
+            return None
+        if result.returncode != 0:
+            return None
+        return result.stdout
+
+    # paths from a git command run with -z
+    @staticmethod
+    def git_paths(cmd           )                       :
+        out = Changes.git(cmd)
+        if out is None:
+            return None
+        return set(Util.normpath(x) for x in out.split("\0") if x)
+
+    # files that differ from the commit: modified, staged, deleted or untracked
+    @staticmethod
+    def get_dirty(commit     , base     )                       :
+        diff = Changes.git_paths(["diff", "--name-only", "--relative", "-z", commit, "--", base])
+        untracked = Changes.git_paths(["ls-files", "--others", "--exclude-standard", "-z", "--", base])
+        if diff is None or untracked is None:
+            return None
+        return diff | untracked
+
+    @staticmethod
+    def hash_or_none(path     )                  :
+        return Util.file_hash(path) if os.path.isfile(path) else None
+
+    @staticmethod
+    def load_build()                :
+        if not os.path.isfile(Changes.LAST_BUILD):
+            return {}
+        with open(Changes.LAST_BUILD, "r") as f:
+            text = f.read().strip()
+        try:
+            return json.loads(text)
+        except ValueError:
+            return {"commit": text, "dirty": {}}  # old format, only the commit
+
+    @staticmethod
+    def from_git(base     , rebuild_all      )             :
+        changes = Changes(rebuild_all, base)
+        if Changes.git(["rev-parse", "--is-inside-work-tree"]) is None:
+            print("  warning: not a git repository, using mtimes")
+            changes.base = None
+            return changes
+        last = Changes.load_build()
+        commit = last.get("commit")
+        if not commit or Changes.git(["cat-file", "-e", commit + "^{commit}"]) is None:
+            print("  warning: last built commit unknown, rebuilding all")
+            changes.rebuild_all = True
+            return changes
+        files = Changes.get_dirty(commit, base)
+        if files is None:
+            print("  warning: git diff failed, rebuilding all")
+            changes.rebuild_all = True
+            return changes
+        dirty = last.get("dirty", {})
+        # a file built from the working tree is changed if its content is not the one built,
+        # including when it was reverted to the commit
+        files = set(x for x in files if x not in dirty or Changes.hash_or_none(x) != dirty[x])
+        files |= set(x for x in dirty if Changes.hash_or_none(x) != dirty[x])
+        changes.files = files
+        changes.incremental = True
+        print("  git: " + str(len(files)) + " changed files since " + commit[:8])
+        if any(Util.join([base, x]) in files for x in Changes.GLOBAL_FILES):
+            print("  git: categories or symbols changed, rebuilding all")
+            changes.rebuild_all = True
+        return changes
+
+    def save_build(self):
+        if self.base is None:
+            return
+        head = Changes.git(["rev-parse", "HEAD"])
+        if head is None:
+            return
+        head = head.strip()
+        dirty = Changes.get_dirty(head, self.base)
+        if dirty is None:
+            return
+        state = {"commit": head, "dirty": {x: Changes.hash_or_none(x) for x in sorted(dirty)}}
+        Util.create_dirs_if_needed(Changes.LAST_BUILD)
+        Journal.watch(Changes.LAST_BUILD)
+        with open(Changes.LAST_BUILD, "w") as f:
+            f.write(json.dumps(state, indent=2) + "\n")
+
+    def is_outdated(self, source     , target     )        :
+        if self.rebuild_all or not os.path.isfile(target):
+            return True
+        if self.files is None:
+            return os.path.getmtime(source) > os.path.getmtime(target)
+        return Util.normpath(source) in self.files
+
+    # any file in the item folder (text, images, tests) changed
+    def is_item_outdated(self, item      , target     )        :
+        if self.rebuild_all or not os.path.isfile(target):
+            return True
+        if self.files is None:
+            return os.path.getmtime(item.path_full) > os.path.getmtime(target)
+        prefix = Util.join([item.base, item.hook]) + os.sep
+        return any(x.startswith(prefix) for x in self.files)
+
+
 class Config:
     @staticmethod
     def get_default_cfg():
@@ -105,7 +349,7 @@ class Config:
                     "action": "run",
                     "cmds": [
                         ["cmd", "arg", "arg"],
-                        ["cmd", "arg", "arg"]
+                        {"cmd": ["cmd", "arg", "arg"], "inputs": ["base/**/*.md"], "outputs": ["out_file"]}
                     ]
                 },
                 {
@@ -123,7 +367,8 @@ class Config:
                 {
                     "action": "thumbs", 
                     "width": 320,
-                    "height": 180
+                    "height": 180,
+                    "placeholder": "color"
                 },
                 {
                     "action": "index", 
@@ -178,6 +423,7 @@ class Config:
         if not os.path.isfile(symbols_file):
             print("  warning: .symbols.json not found in", symbols_file, ", loading default value and creating file")
             symbols = Config.get_default_symbols()
+            Journal.watch(symbols_file)
             with open(symbols_file, "w", encoding="utf-8") as f:
                 f.write(json.dumps(symbols, indent=2))
             return symbols
@@ -233,13 +479,15 @@ class Item:
                 lines[i] = lines[i] + "\n"
 
         if fulltext != "".join(lines):
+            Journal.watch(readme_path)
             with open(readme_path, "w") as f:
                 f.write("".join(lines))
 
         return lines[0][:-1], lines[1][:-1], "".join(lines[2:])
 
-    def __init__(self, symbols, path):
+    def __init__(self, symbols, path, strict=True):
         self.symbols = symbols
+        self.strict = strict
         crude_title, self.description, self.content = Item.normalize_file(path)
         self.__parse_title(crude_title)
         self.path_full = Util.normpath(path)                               # arcade/base/000/Readme.md
@@ -249,6 +497,7 @@ class Item:
         self.cover = self.__get_cover()                                    # cover.jpg ou ../001/cover.jpg
         self.fulltitle = self.__sort_fulltitle()                           # first line content withoub the \n
         if crude_title != self.fulltitle:
+            Journal.watch(path)
             with open(path, "w") as f:
                 f.write(self.fulltitle + "\n" + self.content)
 
@@ -284,7 +533,9 @@ class Item:
             img = os.path.normpath(match.group(2))  # cover.jpg
             if not os.path.isfile(Util.join([self.base, self.hook, img])):
                 print("  error: cover image not found in ", self.path_full)
-                exit(1)
+                if self.strict:
+                    exit(1)
+                return None
             return img
         return None
 
@@ -381,6 +632,7 @@ class LabelRepository:
             if key not in qtds:
                 qtds[key] = 0
 
+        Journal.watch(self.source)
         with open(self.source, "w") as out:
             write = csv.writer(out, delimiter=',', quotechar='"')
             for x in sorted(self.labels.values()):  # ordena pelo indice
@@ -441,8 +693,9 @@ class Sorter:
 
 
 class ItemRepository:
-    def __init__(self, base     ):
+    def __init__(self, base     , strict       = True):
         self.base = os.path.normpath(base)
+        self.strict = strict
         self.__test_exists()
         self.itens             = []
         self.symbols                 = Config.load_symbols(self.get_symbols_file_path())
@@ -474,7 +727,7 @@ class ItemRepository:
                 if file.startswith("_") or file.startswith(">"):
                     continue
                 path = Util.join([root, file])
-                self.itens.append(Item(self.symbols, path))
+                self.itens.append(Item(self.symbols, path, self.strict))
 
 
 class Board:
@@ -502,6 +755,7 @@ class Board:
             if not os.path.isfile(path):
                 Util.create_dirs_if_needed(path)
                 print("  warning: file", path, "not found, creating!")
+                Journal.watch(path)
                 with open(path, "w") as f:
                     f.write(fulltitle + " #empty\n")
                     f.write(description + "\n")
@@ -513,6 +767,7 @@ class Board:
                 old_description = data[1] if len(data) > 1 else ""
                 new_description = description + "\n"
                 if old_first_line != new_first_line or old_description != new_description:
+                    Journal.watch(path)
                     with open(path, "w") as f:
                         content = "".join(data[2:]) if len(data) > 2 else ""
                         f.write(new_first_line + new_description + content)
@@ -541,6 +796,7 @@ class Board:
         paths = [x.ljust(max_len_path) for x in paths]
         full_titles = [x.ljust(max_len_title) for x in full_titles]
         Util.create_dirs_if_needed(board_file)
+        Journal.watch(board_file)
         with open(board_file, "w") as names:
             for i in range(len(paths)):
                 names.write(paths[i] + " : " + full_titles[i] + " : " + subtitles[i] + "\n")
@@ -550,11 +806,13 @@ class Links:
     @staticmethod
     def generate(item_rep                , links_dir     ):
         if os.path.isdir(links_dir):
+            Journal.watch_tree(links_dir)
             rmtree(links_dir, ignore_errors=True)
         if not os.path.isdir(links_dir):
             os.makedirs(links_dir)
         for item in item_rep.itens:
             path = Util.join([links_dir, item.title.strip() + ".md"])
+            Journal.watch(path)
             with open(path, "w") as f:
                 f.write("[LINK](" + Util.get_directions(path, item.path_full) + ")\n")
 
@@ -600,19 +858,26 @@ class View:
         return a, b, c
 
     @staticmethod
-    def __make_table_entry(item_list            , out_file     , empty_fig     , posts_per_row     ):
+    def __make_table_entry(item_list            , out_file     , empty_fig     , posts_per_row     ,
+                           manifest               , sheet                ):
         data = []
         for item in item_list:
             thumb = Thumbs.get_thumb_full(item)
+            info = None
             if thumb:
                 thumb = Util.get_directions(out_file, thumb)
+                info = manifest.get(item)
             else:
                 if empty_fig:
                     thumb = Util.get_directions(out_file, empty_fig)
                 else:
                     thumb = "https://placekitten.com/320/181"
             file_path = Util.get_directions(out_file, item.path_full + "#" + Util.get_md_link(item.fulltitle))
-            entry = "[![](" + thumb + ")](" + file_path + ")"
+            entry = Sprites.get_entry(item, sheet, out_file, file_path) if sheet and info else None
+            if entry is None and info:
+                entry = '[<img src="' + thumb + '"' + ThumbManifest.img_attrs(info) + '>](' + file_path + ")"
+            elif entry is None:
+                entry = "[![](" + thumb + ")](" + file_path + ")"
             if item.date:
                 data.append([entry, "@" + item.date + "<br>" + item.title])
             else:
@@ -631,8 +896,10 @@ class View:
         return "".join(lines)
 
     @staticmethod
-    def generate( item_rep               , out_file, group_by, reverse_sort, empty_fig     , posts_per_row     ):
+    def generate( item_rep               , out_file, group_by, reverse_sort, empty_fig     , posts_per_row     ,
+                  css_sprites      ):
         groups = Sorter.group_by(item_rep.itens, item_rep.cat_labels, group_by, reverse_sort)
+        manifest = ThumbManifest(item_rep.base)
         output = io.StringIO()
         output.write("\n## Links\n")
         for key, _item_list in groups:
@@ -641,17 +908,103 @@ class View:
             output.write("- [" + label + "](#" + link + ")\n")
         for key, item_list in groups:
             output.write("\n## " + Util.get_key_name(key, group_by, item_rep.cat_labels) + "\n\n")
-            text = View.__make_table_entry(item_list, out_file, empty_fig, posts_per_row)
+            sheet = Sprites.load(item_rep.base, key) if css_sprites and group_by == "categories" else None
+            text = View.__make_table_entry(item_list, out_file, empty_fig, posts_per_row, manifest, sheet)
             output.write(text)
         return output.getvalue()
 
 
+class ThumbManifest:
+    # sidecar with the intrinsic size and a tiny placeholder of each thumb
+    # { ".thumb/hook/Readme.jpg": {"sha1": "...", "width": 320, "height": 180, "mode": "color", "placeholder": "#a0b0c0"} }
+    def __init__(self, base     ):
+        self.path = Util.join([base, ".thumb", "manifest.json"])
+        self.entries = {}
+        if os.path.isfile(self.path):
+            with open(self.path, "r") as f:
+                self.entries = json.load(f)
+
+    def get(self, item      ):
+        thumb = Thumbs.get_thumb(item)
+        if thumb is None:
+            return None
+        return self.entries.get(thumb)
+
+    def update(self, item      , placeholder                  , cache                ):
+        thumb_full = Thumbs.get_thumb_full(item)
+        if thumb_full is None or not os.path.isfile(thumb_full):
+            return
+        sha1 = Util.file_hash(thumb_full)
+        entry = self.entries.get(Thumbs.get_thumb(item))
+        if entry and entry["sha1"] == sha1 and entry.get("mode") == placeholder:
+            return
+        key = "info-" + sha1 + "-" + str(placeholder)
+        entry = cache.get_json(key) if cache else None
+        if entry is None:
+            width, height = Thumbs.get_size(thumb_full)
+            entry = {
+                "sha1": sha1,
+                "width": width,
+                "height": height,
+                "mode": placeholder,
+                "placeholder": Thumbs.get_placeholder(thumb_full, placeholder)
+            }
+            if cache:
+                cache.put_json(key, entry)
+        self.entries[Thumbs.get_thumb(item)] = entry
+
+    def save(self):
+        Util.create_dirs_if_needed(self.path)
+        Journal.watch(self.path)
+        with open(self.path, "w") as f:
+            f.write(json.dumps(self.entries, indent=2, sort_keys=True))
+
+    # html attributes to reserve the image box and paint the placeholder while it loads
+    @staticmethod
+    def img_attrs(entry                ):
+        if entry is None:
+            return ""
+        out = ' width="' + str(entry["width"]) + '" height="' + str(entry["height"]) + '"'
+        placeholder = entry.get("placeholder")
+        if placeholder:
+            if placeholder.startswith("data:"):
+                out += ' style="background:url(' + placeholder + ') center/cover"'
+            else:
+                out += ' style="background:' + placeholder + '"'
+        return out
+
+
 class Thumbs:
     @staticmethod
-    def generate(item_rep                , width     , height     , rebuild_all      ):
+    def generate(item_rep                , width     , height     , changes         , placeholder                  ,
+                 cache                , sprites      ):
         itens = sorted(item_rep.itens, key=lambda x: x.hook)
+        manifest = ThumbManifest(item_rep.base)
         for item in itens:
-            Thumbs.make(item, width, height, rebuild_all)
+            Thumbs.make(item, width, height, changes, cache)
+            manifest.update(item, placeholder, cache)
+        manifest.save()
+        if sprites:
+            Sprites.generate(item_rep, manifest)
+
+    @staticmethod
+    def get_size(thumb_full     )                  :
+        cmd = ['identify', '-format', '%w %h', thumb_full + '[0]']
+        out = subprocess.run(cmd, stdout=subprocess.PIPE, universal_newlines=True).stdout.split()
+        return int(out[0]), int(out[1])
+
+    # "color": dominant color as #rrggbb, "blur": tiny jpeg as data uri
+    @staticmethod
+    def get_placeholder(thumb_full     , mode                  )                  :
+        if mode == "color":
+            cmd = ['convert', thumb_full + '[0]', '-resize', '1x1!', '-format', '#%[hex:u.p{0,0}]', 'info:']
+            color = subprocess.run(cmd, stdout=subprocess.PIPE, universal_newlines=True).stdout.strip()
+            return color[:7].lower()
+        if mode == "blur":
+            cmd = ['convert', thumb_full + '[0]', '-resize', '16x16', '-strip', '-quality', '40', 'jpg:-']
+            data = subprocess.run(cmd, stdout=subprocess.PIPE).stdout
+            return "data:image/jpeg;base64," + base64.b64encode(data).decode("ascii")
+        return None
 
     # return .thumb/hook/Readme.jpg
     @staticmethod
@@ -668,43 +1021,242 @@ class Thumbs:
         return None
 
     @staticmethod
-    def make(item      , width     , height     , rebuild_all      ):
+    def make(item      , width     , height     , changes         , cache                ):
         thumb_full = Thumbs.get_thumb_full(item)
         if thumb_full is None:
             print("  warning: thumb skipping, missing cover on", item.path_full)
             return
         cover_full = Util.join([item.base, item.hook, item.cover])
         Util.create_dirs_if_needed(thumb_full)
-        if rebuild_all or not os.path.isfile(thumb_full) or os.path.getmtime(cover_full) > os.path.getmtime(thumb_full):
+        if changes.is_outdated(cover_full, thumb_full):
+            Journal.watch(thumb_full)
+            key = None
+            if cache:
+                key = "thumb-" + Util.file_hash(cover_full) + "-" + str(width) + "x" + str(height)
+                if cache.get_file(key, thumb_full):
+                    print("  thumb from cache for", item.path_full)
+                    return
             print("  making thumb for", item.path_full)
             cmd = ['convert', cover_full, '-resize', str(width) + 'x' + str(height) + '>', thumb_full]
-            subprocess.run(cmd)
+            if subprocess.run(cmd).returncode != 0:
+                print("  warning: convert failed for", item.path_full)
+                return
+            if cache:
+                cache.put_file(key, thumb_full)
 
 
-class Posts:
+class Sprites:
+    # one vertical sheet per category with all its thumbs, so a category costs a single image request
+    # base/.thumb/sprites/<cat>.json: {"sha1": "...", "image": "<cat>.jpg", "width": 320, "height": 540,
+    #                                  "members": {".thumb/hook/Readme.jpg": {"x": 0, "y": 180, "width": 320, "height": 180}}}
     @staticmethod
-    def write_post(item      , cat_labels                 , posts_dir     , default_date                  , remote):
-        if item.date is None and default_date is None:
-            print("  warning: Date missing, using on", item.path_full, ", skipping")
+    def get_dir(base     )       :
+        return Util.join([base, ".thumb", "sprites"])
+
+    @staticmethod
+    def load(base     , key     )                  :
+        path = Util.join([Sprites.get_dir(base), key + ".json"])
+        if not os.path.isfile(path):
+            return None
+        with open(path, "r") as f:
+            return json.load(f)
+
+    @staticmethod
+    def make(base     , key     , itens            , manifest               ):
+        members = []
+        for item in sorted(itens, key=lambda x: x.hook):
+            info = manifest.get(item)
+            if info:
+                members.append((Thumbs.get_thumb(item), info))
+        if len(members) == 0:
             return
-        if item.date is None:
-            item.date = default_date
-        if item.cover is None:
-            print("  warning: Cover missing, skip", item.path_full)
+        sha1 = hashlib.sha1("\n".join(x + ":" + info["sha1"] for x, info in members).encode()).hexdigest()
+        old = Sprites.load(base, key)
+        image = Util.join([Sprites.get_dir(base), key + ".jpg"])
+        if old and old["sha1"] == sha1 and os.path.isfile(image):
             return
-        if remote[-1] == "/":
-            remote = remote[:-1]
+        print("  making sprite for", key)
+        sheet = {"sha1": sha1, "image": key + ".jpg", "width": max(info["width"] for _x, info in members),
+                 "height": sum(info["height"] for _x, info in members), "members": {}}
+        y = 0
+        for thumb, info in members:
+            sheet["members"][thumb] = {"x": 0, "y": y, "width": info["width"], "height": info["height"]}
+            y += info["height"]
+        Util.create_dirs_if_needed(image)
+        Journal.watch(image)
+        Journal.watch(Util.join([Sprites.get_dir(base), key + ".json"]))
+        cmd = ['convert'] + [Util.join([base, x]) for x, _info in members]
+        cmd += ['-background', 'white', '-gravity', 'west', '-append', image]
+        if subprocess.run(cmd).returncode != 0:
+            print("  warning: sprite failed for", key)
+            return
+        with open(Util.join([Sprites.get_dir(base), key + ".json"]), "w") as f:
+            f.write(json.dumps(sheet, indent=2, sort_keys=True))
+
+    @staticmethod
+    def generate(item_rep                , manifest               ):
+        for key, itens in item_rep.cats:
+            Sprites.make(item_rep.base, key, itens, manifest)
+
+    # span showing the item thumb cut from the sheet
+    # the image comes only from the style attribute: it needs a renderer keeping inline css,
+    # GitHub strips it and shows an empty link
+    @staticmethod
+    def get_span(item      , sheet                , image_url     )                  :
+        member = sheet["members"].get(Thumbs.get_thumb(item))
+        if member is None:
+            return None
+        style = "display:inline-block;width:%dpx;height:%dpx;background:url(%s) %dpx %dpx no-repeat" % \
+                (member["width"], member["height"], image_url, -member["x"], -member["y"])
+        return '<span role="img" aria-label="' + html.escape(item.title) + '" style="' + style + '"></span>'
+
+    # markdown entry for the view
+    @staticmethod
+    def get_entry(item      , sheet                , out_file     , link     )                  :
+        image = Util.get_directions(out_file, Util.join([Sprites.get_dir(item.base), sheet["image"]]))
+        span = Sprites.get_span(item, sheet, image)
+        return "[" + span + "](" + link + ")" if span else None
+
+
+class Fingerprint:
+    # publishes files under content hashed names, so they can be cached forever
+    # manifest: { "base/01/__capa.jpg": {"name": "__capa.1a2b3c4d5e.jpg", "size": 1234, "mtime": 1571900000.0} }
+    EXTENSIONS = [".jpg", ".jpeg", ".png", ".gif", ".svg", ".webp"]
+
+    def __init__(self, assets_dir     , assets_remote     ):
+        self.assets_dir = Util.normpath(assets_dir)
+        self.remote = assets_remote[:-1] if assets_remote.endswith("/") else assets_remote
+        self.path = Util.join([self.assets_dir, "manifest.json"])
+        self.entries = {}
+        if os.path.isfile(self.path):
+            with open(self.path, "r") as f:
+                self.entries = json.load(f)
+
+    @staticmethod
+    # files: scan of the base, paths outside it are checked on disk
+    def is_asset(path     , files          , base     )        :
+        if os.path.splitext(path)[1].lower() not in Fingerprint.EXTENSIONS:
+            return False
+        if path.startswith(base + os.sep):
+            return path in files
+        return os.path.isfile(path)
+
+    def publish(self, path     )       :
+        path = Util.normpath(path)
+        stat = os.stat(path)
+        entry = self.entries.get(path)
+        if entry is None or entry["size"] != stat.st_size or entry["mtime"] != stat.st_mtime:
+            stem, ext = os.path.splitext(os.path.basename(path))
+            entry = {"name": stem + "." + Util.file_hash(path)[:10] + ext, "size": stat.st_size, "mtime": stat.st_mtime}
+            self.entries[path] = entry
+        dest = Util.join([self.assets_dir, entry["name"]])
+        if not os.path.isfile(dest):
+            Util.create_dirs_if_needed(dest)
+            Journal.watch(dest)
+            shutil.copyfile(path, dest)
+        return entry["name"]
+
+    def url(self, path     )       :
+        return self.remote + "/" + self.publish(path)
+
+    def save(self):
+        Util.create_dirs_if_needed(self.path)
+        Journal.watch(self.path)
+        with open(self.path, "w") as f:
+            f.write(json.dumps(self.entries, indent=2, sort_keys=True))
+
+
+class VideoFacade:
+    # replaces youtube iframes by a poster image that loads the player only when clicked
+    REGEX = r'<iframe([^>]*?)\ssrc="((?:https?:)?//(?:www\.)?youtube(?:-nocookie)?\.com/embed/([\w-]{11})[^"]*)"([^>]*)>\s*</iframe>'
+    POSTER = "https://i.ytimg.com/vi/%s/hqdefault.jpg"
+
+    def __init__(self, posters_dir                  , posters_remote                  ):
+        self.posters_dir = Util.normpath(posters_dir) if posters_dir else None
+        self.remote = posters_remote
+        if self.posters_dir and not self.remote:
+            self.remote = "/" + self.posters_dir
+        if self.remote and self.remote.endswith("/"):
+            self.remote = self.remote[:-1]
+
+    # download the poster once, falling back to the remote thumbnail
+    def get_poster(self, video_id     , assets                     )       :
+        remote = VideoFacade.POSTER % video_id
+        if not self.posters_dir:
+            return remote
+        path = Util.join([self.posters_dir, video_id + ".jpg"])
+        if not os.path.isfile(path):
+            print("  downloading poster for video", video_id)
+            try:
+                with urllib.request.urlopen(remote, timeout=10) as response:
+                    data = response.read()
+            except OSError as e:
+                print("  warning: poster download failed for", video_id, str(e))
+                return remote
+            Util.create_dirs_if_needed(path)
+            Journal.watch(path)
+            with open(path, "wb") as f:
+                f.write(data)
+        if assets:
+            return assets.url(path)
+        return self.remote + "/" + video_id + ".jpg"
+
+    @staticmethod
+    def get_attr(attrs     , name     , default     )       :
+        match = re.search(r'\b' + name + r'="(\d+)"', attrs)
+        return match.group(1) if match else default
+
+    # video id -> poster url, resolved before rendering since it may download files
+    def get_posters(self, text     , assets                     )                  :
+        return {x[2]: self.get_poster(x[2], assets) for x in re.findall(VideoFacade.REGEX, text)}
+
+    @staticmethod
+    def apply(text     , posters                )       :
+        def make_facade(m):
+            attrs = m.group(1) + " " + m.group(4)
+            src, video_id = m.group(2), m.group(3)
+            width = VideoFacade.get_attr(attrs, "width", "560")
+            height = VideoFacade.get_attr(attrs, "height", "315")
+            src += ("&" if "?" in src else "?") + "autoplay=1"
+            iframe = ('<iframe width="' + width + '" height="' + height + '" src="' + src + '" frameborder="0" '
+                      'allow="autoplay; encrypted-media" allowfullscreen></iframe>')
+            onclick = "this.outerHTML='" + html.escape(iframe, quote=True) + "';return false"
+            return ('<a class="lite-video" href="https://www.youtube.com/watch?v=' + video_id + '" '
+                    'style="display:inline-block;position:relative;max-width:100%" onclick="' + onclick + '">'
+                    '<img src="' + posters.get(video_id, VideoFacade.POSTER % video_id) + '" width="' + width + '" height="' + height +
+                    '" loading="lazy" alt="YouTube video" style="object-fit:cover">'
+                    '<span style="position:absolute;left:50%;top:50%;transform:translate(-50%,-50%);'
+                    'font-size:48px;color:#fff;text-shadow:0 0 8px #000">&#9654;</span></a>')
+        return re.sub(VideoFacade.REGEX, make_facade, text)
+
+
+class Posts:
+    LINK = r"\[(.*?)\]\(([^:]*?)\)"
+    IMG = r"<img src=\"([^:]*?)\""
+
+    # runs on the worker pool, so it only computes text: every file lookup was resolved before
+    # urls: local asset path -> published url, posters: video id -> poster url
+    @staticmethod
+    def render_post(item      , category       , remote     , info                , urls                ,
+                    posters                , has_tests      )                  :
         out = io.StringIO()
         out.write("---\nlayout: post\n")
         out.write("title: " + item.title + '\n')
-        out.write("image: " + remote + "/" + item.hook + "/" + item.cover + "\n")
-        out.write("optimized_image: " + remote + "/" + Thumbs.get_thumb(item) + "\n")
+        cover_full = Util.join([item.base, item.hook, item.cover])
+        # cover or thumb missing on disk are not published, they keep the remote url
+        out.write("image: " + urls.get(cover_full, remote + "/" + item.hook + "/" + item.cover) + "\n")
+        thumb_url = urls.get(Thumbs.get_thumb_full(item), remote + "/" + Thumbs.get_thumb(item))
+        out.write("optimized_image: " + thumb_url + "\n")
+        if info:
+            out.write("optimized_image_width: " + str(info["width"]) + "\n")
+            out.write("optimized_image_height: " + str(info["height"]) + "\n")
+            if info.get("placeholder"):
+                out.write("optimized_image_placeholder: \"" + info["placeholder"] + "\"\n")
         if item.description:
             description = Util.extract_title_content(item.description)
             out.write("subtitle: " + description + "\n")
             out.write("description: " + description + "\n")
 
-        category = cat_labels.get_label(item.categories[0])
         out.write("category: " + category.key + "\n")
         if Label.ORPHAN not in item.tags:
             out.write("tags:\n")
@@ -717,68 +1269,132 @@ class Posts:
         warning_msg = "<!-- DON'T EDIT THIS FILE, GENERATED BY SCRIPT -->\n" * 5
         out.write(warning_msg)
         out.write(item.content)
-        out.write(Posts.get_tests_link(item))
+        if has_tests:
+            out.write("\n## Tests\n[DONWLOAD](t.tio)\n\n")
         text = out.getvalue()
 
-        regex = r"\[(.*?)\]\(([^:]*?)\)"
-        text = re.sub("!" + regex, "", text, 1, re.MULTILINE)  # removing cover
-        subst = "[\\1](" + remote + "/" + item.hook + "/" + "\\2)"
-        text = re.sub(regex, subst, text, 0, re.MULTILINE)  # creating full url for links
+        def get_url(path):
+            local = Util.join([item.base, item.hook, path])
+            if local in urls:
+                return urls[local]
+            return remote + "/" + item.hook + "/" + path
+
+        text = re.sub("!" + Posts.LINK, "", text, 1, re.MULTILINE)  # removing cover
+        subst = lambda m: "[" + m.group(1) + "](" + get_url(m.group(2)) + ")"
+        text = re.sub(Posts.LINK, subst, text, 0, re.MULTILINE)  # creating full url for links
 
-        regex = r"<img src=\"([^:]*?)\""
-        subst = '<img src=\"' + remote + "/" + item.hook + "/" + "\\1" + '\"'
-        text = re.sub(regex, subst, text, 0, re.MULTILINE)
+        subst = lambda m: '<img src=\"' + get_url(m.group(1)) + '\"'
+        text = re.sub(Posts.IMG, subst, text, 0, re.MULTILINE)
+
+        if posters is not None:  # after the rewrites, local poster urls have no scheme
+            text = VideoFacade.apply(text, posters)
 
         name = "%s-c%02d-%s-%s" % (item.date, category.index, category.key, item.title)
         name = Util.get_md_link(name) + "-@" + item.hook + ".md"
         while "--" in name:
             name = name.replace("--", "-")
-        with open(posts_dir + os.sep + name, "w") as f:
-            f.write(text)
+        return name, text
 
     @staticmethod
-    def get_tests_link(item      ):
-        out = io.StringIO()
-        out.write("\n## Tests\n")
-        test_path = Util.join([item.base, item.hook, "t.tio"])
-        if os.path.isfile(test_path):
-            out.write("[DONWLOAD](t.tio)\n\n")
-            return out.getvalue()
-        return ""
-
-    @staticmethod 
-    def find_old_posts(item      , posts_dir     ):
-        files = os.listdir(posts_dir)
-        files = [Util.join([posts_dir, x]) for x in files]
-        files = [x for x in files if os.path.isfile(x)]
-        files = [x for x in files if x.endswith("-@" + item.hook + ".md")]
+    def render_task(task       )                  :
+        return Posts.render_post(*task)
+
+    # publishes cover, thumb and the images linked by the item, return local path -> url
+    @staticmethod
+    def get_urls(item      , assets            , files          )                 :
+        paths = [Util.join([item.base, item.hook, item.cover]), Thumbs.get_thumb_full(item)]
+        paths = [x for x in paths if x in files]
+        refs = [x[1] for x in re.findall(Posts.LINK, item.content)] + re.findall(Posts.IMG, item.content)
+        for ref in refs:
+            local = Util.join([item.base, item.hook, ref])
+            if Fingerprint.is_asset(local, files, item.base):
+                paths.append(local)
+        return {x: assets.url(x) for x in paths}
+
+    # all files under base, from a single walk
+    @staticmethod
+    def scan_files(base     )                :
+        files = set()
+        for (root, _dirs, names) in os.walk(base):
+            files.update(Util.join([root, x]) for x in names)
         return files
 
+    # hook -> posts already in posts_dir, from a single listing
+    @staticmethod
+    def scan_posts(posts_dir     )                        :
+        posts = {}
+        for name in sorted(os.listdir(posts_dir)):
+            path = Util.join([posts_dir, name])
+            match = re.search(r"-@(.*)\.md$", name)
+            if match and os.path.isfile(path):
+                posts.setdefault(match.group(1), []).append(path)
+        return posts
+
     # return if content is new
+    # old_posts is shared by the items of the same hook folder, removed posts leave the list
     @staticmethod
-    def is_new_content(item      , posts_dir     , rebuild_all      ):
-        files = Posts.find_old_posts(item, posts_dir)
-        if len(files) == 0:
+    def is_new_content(item      , old_posts           , changes         ):
+        if len(old_posts) == 0:
             return True
         is_new = False
-        for file in files:
-            if rebuild_all or os.path.getmtime(item.path_full) > os.path.getmtime(file):
+        for file in old_posts[:]:
+            if changes.is_item_outdated(item, file):
                 print("  replacing post", file)
+                Journal.watch(file)
                 os.remove(file)
+                old_posts.remove(file)
                 is_new = True
         return is_new
 
+    @staticmethod
+    def write_post(posts_dir     , name     , text     ):
+        Journal.watch(posts_dir + os.sep + name)
+        with open(posts_dir + os.sep + name, "w") as f:
+            f.write(text)
+
     @staticmethod
     def generate(item_rep                , posts_dir     , default_date                  , remote     ,
-                 categories_dir     , file_linker     , rebuild_all      ):
+                 categories_dir     , file_linker     , changes         , assets                     ,
+                 videos                     , jobs     ):
+        if remote[-1] == "/":
+            remote = remote[:-1]
+        manifest = ThumbManifest(item_rep.base)
+        files = Posts.scan_files(item_rep.base)
+        old_posts = Posts.scan_posts(posts_dir)
+        tasks = []
         for item in item_rep.itens:
-            Posts.is_new_content(item, posts_dir, rebuild_all)
-            Posts.write_post(item, item_rep.cat_labels, posts_dir, default_date, remote)
+            is_new = Posts.is_new_content(item, old_posts.setdefault(item.hook, []), changes)
+            if changes.incremental and not is_new:
+                continue
+            if item.date is None and default_date is None:
+                print("  warning: Date missing, using on", item.path_full, ", skipping")
+                continue
+            if item.date is None:
+                item.date = default_date
+            if item.cover is None:
+                print("  warning: Cover missing, skip", item.path_full)
+                continue
+            category = item_rep.cat_labels.get_label(item.categories[0])
+            urls = Posts.get_urls(item, assets, files) if assets else {}
+            posters = videos.get_posters(item.content, assets) if videos else None
+            has_tests = Util.join([item.base, item.hook, "t.tio"]) in files
+            tasks.append((item, category, remote, manifest.get(item), urls, posters, has_tests))
+        if assets:
+            assets.save()
+
+        if jobs > 1 and len(tasks) >= 4 * jobs:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                posts = list(pool.map(Posts.render_task, tasks, chunksize=max(1, len(tasks) // (4 * jobs))))
+        else:
+            posts = [Posts.render_task(x) for x in tasks]
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+            list(pool.map(lambda x: Posts.write_post(posts_dir, x[0], x[1]), posts))
         Posts.generate_categories_files(item_rep, categories_dir, file_linker)
 
     @staticmethod
     def generate_categories_files(item_rep                , categories_dir     , file_linker     ):
         categories_dir = os.path.normpath(categories_dir)
+        Journal.watch_tree(categories_dir)
         rmtree(categories_dir, ignore_errors=True)
         os.mkdir(categories_dir)
         link_entries = []
@@ -786,6 +1402,7 @@ class Posts:
             cat = item_rep.cat_labels.get_label(key)
             if len(itens) > 0:
                 link_entries.append('<li><a href="/category/' + cat.key + '">{{ "' + cat.label + '" }}</a></li>\n')
+                Journal.watch(Util.join([categories_dir, cat.key + ".md"]))
                 with open(Util.join([categories_dir, cat.key + ".md"]), "w") as f:
                     f.write("---\n")
                     f.write("layout: category\n")
@@ -799,14 +1416,587 @@ class Posts:
             regex = r"<!--BEGIN-->\n(.*?)^\s*<!--END-->"
             subst = "<!--BEGIN-->\\n" + "".join(link_entries) +  "<!--END-->"
             text = re.sub(regex, subst, text, 0, re.MULTILINE | re.DOTALL)
+            Journal.watch(file_linker)
             open(file_linker, "w").write(text)
 
 
+class Markdown:
+    # small markdown to html converter, covering what the items of a base use
+    HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+    ULIST = re.compile(r"^\s*[-*+]\s+(.*)$")
+    OLIST = re.compile(r"^\s*\d+[.)]\s+(.*)$")
+    RULE = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+
+    @staticmethod
+    def inline(text     )       :
+        codes = []
+
+        def keep_code(m):
+            codes.append("<code>" + html.escape(m.group(1)) + "</code>")
+            return "\x00" + str(len(codes) - 1) + "\x00"
+        text = re.sub(r"`([^`]+)`", keep_code, text)
+        text = re.sub(r"!\[(.*?)\]\((.*?)\)", r'<img src="\2" alt="\1">', text)
+        text = re.sub(r"\[(.*?)\]\((.*?)\)", r'<a href="\2">\1</a>', text)
+        text = re.sub(r"\*\*(.+?)\*\*", r"<strong>\1</strong>", text)
+        text = re.sub(r"(?<![\w*])\*(?!\s)(.+?)(?<!\s)\*(?![\w*])", r"<em>\1</em>", text)
+        text = re.sub(r"  $", "<br>", text, flags=re.MULTILINE)
+        return re.sub("\x00(\\d+)\x00", lambda m: codes[int(m.group(1))], text)
+
+    @staticmethod
+    def to_html(text     )       :
+        out = []
+        para = []
+        items = []
+        list_tag = None
+        lines = text.split("\n")
+
+        def flush():
+            nonlocal list_tag
+            if para:
+                out.append("<p>" + Markdown.inline("\n".join(para)) + "</p>")
+                para.clear()
+            if items:
+                out.append("<" + list_tag + ">\n" + "".join("<li>" + x + "</li>\n" for x in items) + "</" + list_tag + ">")
+                items.clear()
+                list_tag = None
+
+        i = 0
+        while i < len(lines):
+            line = lines[i]
+            heading = Markdown.HEADING.match(line)
+            ulist = Markdown.ULIST.match(line)
+            olist = Markdown.OLIST.match(line)
+            if line.strip() == "":
+                flush()
+            elif line.startswith("```"):
+                flush()
+                code = []
+                i += 1
+                while i < len(lines) and not lines[i].startswith("```"):
+                    code.append(lines[i])
+                    i += 1
+                out.append("<pre><code>" + html.escape("\n".join(code)) + "</code></pre>")
+            elif Util.only_hashtags(line.strip()):
+                flush()  # empty heading, used as a blank description
+            elif heading:
+                flush()
+                level = str(len(heading.group(1)))
+                title = heading.group(2)
+                out.append("<h" + level + ' id="' + Util.get_md_link(title) + '">' + Markdown.inline(title) +
+                           "</h" + level + ">")
+            elif Markdown.RULE.match(line):
+                flush()
+                out.append("<hr>")
+            elif ulist or olist:
+                tag = "ul" if ulist else "ol"
+                if para or (list_tag and list_tag != tag):
+                    flush()
+                list_tag = tag
+                items.append(Markdown.inline((ulist or olist).group(1)))
+            elif line.startswith(">"):
+                flush()
+                quote = []
+                while i < len(lines) and lines[i].startswith(">"):
+                    quote.append(re.sub(r"^>\s?", "", lines[i]))
+                    i += 1
+                out.append("<blockquote>\n" + Markdown.to_html("\n".join(quote)) + "</blockquote>")
+                continue
+            elif line.lstrip().startswith("<") and not para:
+                flush()
+                out.append(line)  # raw html goes untouched
+            elif items:
+                items[-1] += "\n" + Markdown.inline(line.strip())
+            else:
+                para.append(line)
+            i += 1
+        flush()
+        return "".join(x + "\n" for x in out)
+
+
+class HtmlSite:
+    # renders the repository straight to static html, without jekyll
+    # state file keeps a signature per page, so unchanged items aren't rendered again
+    POST = """<!DOCTYPE html>
+<html lang="pt-br">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>$title - $site</title>
+<meta name="description" content="$description">
+</head>
+<body>
+<nav><a href="../index.html">$site</a> / <a href="../category/$category_key.html">$category</a></nav>
+<article>
+<h1>$title</h1>
+<p class="date">$date</p>
+$content</article>
+</body>
+</html>
+"""
+    CATEGORY = """<!DOCTYPE html>
+<html lang="pt-br">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>$title - $site</title>
+<meta name="description" content="$description">
+</head>
+<body>
+<nav><a href="../index.html">$site</a></nav>
+<h1>$title</h1>
+<ul class="posts">
+$entries</ul>
+</body>
+</html>
+"""
+    INDEX = """<!DOCTYPE html>
+<html lang="pt-br">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>$site</title>
+</head>
+<body>
+<h1>$site</h1>
+$sections</body>
+</html>
+"""
+    __templates                                      = {}
+
+    # compiled once per process, reloaded only if the template file changes
+    @staticmethod
+    def get_template(name     , path                  )                                 :
+        source = getattr(HtmlSite, name.upper())
+        key = name
+        if path:
+            key = path + ":" + str(os.path.getmtime(path))
+        if key not in HtmlSite.__templates:
+            if path:
+                with open(path, "r") as f:
+                    source = f.read()
+            HtmlSite.__templates[key] = (string.Template(source), hashlib.sha1(source.encode()).hexdigest())
+        return HtmlSite.__templates[key]
+
+    def __init__(self, item_rep                , out_dir     , site     , templates                ,
+                 css_sprites      ):
+        self.item_rep = item_rep
+        self.out_dir = Util.normpath(out_dir)
+        self.site = site
+        self.css_sprites = css_sprites
+        self.sprites = set()  # sheets used in this run
+        self.manifest = ThumbManifest(item_rep.base)
+        self.templates = {x: HtmlSite.get_template(x, templates.get(x)) for x in ["post", "category", "index"]}
+        self.state_path = Util.join([self.out_dir, ".render.json"])
+        self.state = {}
+        if os.path.isfile(self.state_path):
+            with open(self.state_path, "r") as f:
+                self.state = json.load(f)
+
+    @staticmethod
+    def signature(parts           )       :
+        return hashlib.sha1("\x00".join(parts).encode("utf-8")).hexdigest()
+
+    # write only when the content changed, so mtimes of untouched pages stay put
+    def write(self, path     , text     ):
+        if os.path.isfile(path):
+            with open(path, "r") as f:
+                if f.read() == text:
+                    return
+        Util.create_dirs_if_needed(path)
+        Journal.watch(path)
+        with open(path, "w") as f:
+            f.write(text)
+
+    @staticmethod
+    def copy_if_needed(src     , dest     ):
+        if os.path.isfile(dest):
+            a, b = os.stat(src), os.stat(dest)
+            if a.st_size == b.st_size and a.st_mtime == b.st_mtime:
+                return
+        Util.create_dirs_if_needed(dest)
+        Journal.watch(dest)
+        shutil.copy2(src, dest)
+
+    def copy_files(self, item      ):
+        folder = Util.join([item.base, item.hook])
+        for file in sorted(os.listdir(folder)):
+            src = Util.join([folder, file])
+            if file.endswith(".md") or file.startswith(".") or not os.path.isfile(src):
+                continue
+            HtmlSite.copy_if_needed(src, Util.join([self.out_dir, item.hook, file]))
+        thumb = Thumbs.get_thumb_full(item)
+        if thumb and os.path.isfile(thumb):
+            HtmlSite.copy_if_needed(thumb, Util.join([self.out_dir, item.hook, "thumb.jpg"]))
+
+    def render_item(self, item      ):
+        template, template_hash = self.templates["post"]
+        category = self.item_rep.cat_labels.get_label(item.categories[0])
+        path = Util.join([self.out_dir, item.hook, "index.html"])
+        sign = HtmlSite.signature([template_hash, self.site, item.fulltitle, item.description, item.content,
+                                   category.key, category.label])
+        self.copy_files(item)
+        if self.state.get(path) == sign and os.path.isfile(path):
+            return
+        print("  rendering", item.path_full)
+        text = template.safe_substitute(
+            site=html.escape(self.site),
+            title=html.escape(item.title),
+            description=html.escape(Util.extract_title_content(item.description)),
+            date=html.escape(item.date if item.date else ""),
+            category=html.escape(category.label),
+            category_key=category.key,
+            content=Markdown.to_html(item.content))
+        self.write(path, text)
+        self.state[path] = sign
+
+    # category sheet copied to <dir>/sprites, None if missing or disabled
+    def get_sheet(self, key     )                  :
+        if not self.css_sprites:
+            return None
+        sheet = Sprites.load(self.item_rep.base, key)
+        if sheet is None:
+            return None
+        src = Util.join([Sprites.get_dir(self.item_rep.base), sheet["image"]])
+        if not os.path.isfile(src):
+            return None
+        HtmlSite.copy_if_needed(src, Util.join([self.out_dir, "sprites", sheet["image"]]))
+        self.sprites.add(sheet["image"])
+        return sheet
+
+    def make_entry(self, item      , prefix     , sheet                )       :
+        link = prefix + item.hook + "/index.html"
+        thumb = ""
+        thumb_full = Thumbs.get_thumb_full(item)
+        span = Sprites.get_span(item, sheet, prefix + "sprites/" + sheet["image"]) if sheet else None
+        if span:
+            thumb = span + "<br>"
+        elif thumb_full and os.path.isfile(thumb_full):
+            thumb = '<img src="' + prefix + item.hook + '/thumb.jpg" alt=""' + \
+                    ThumbManifest.img_attrs(self.manifest.get(item)) + ' loading="lazy"><br>'
+        date = item.date if item.date else item.hook
+        return '<li><a href="' + link + '">' + thumb + html.escape(date) + " " + html.escape(item.title) + "</a></li>\n"
+
+    def render_categories(self):
+        template, _hash = self.templates["category"]
+        for key, itens in self.item_rep.cats:
+            cat = self.item_rep.cat_labels.get_label(key)
+            itens = sorted(itens, key=lambda x: x.fulltitle, reverse=True)
+            sheet = self.get_sheet(key)
+            text = template.safe_substitute(
+                site=html.escape(self.site),
+                title=html.escape(cat.label),
+                description=html.escape(cat.description),
+                entries="".join(self.make_entry(x, "../", sheet) for x in itens))
+            self.write(Util.join([self.out_dir, "category", cat.key + ".html"]), text)
+
+    def render_index(self):
+        template, _hash = self.templates["index"]
+        sections = io.StringIO()
+        for key, itens in self.item_rep.cats:
+            cat = self.item_rep.cat_labels.get_label(key)
+            sections.write('<h2><a href="category/' + cat.key + '.html">' + html.escape(cat.label) + "</a></h2>\n")
+            sections.write('<ul class="posts">\n')
+            sheet = self.get_sheet(key)
+            for item in sorted(itens, key=lambda x: x.fulltitle, reverse=True):
+                sections.write(self.make_entry(item, "", sheet))
+            sections.write("</ul>\n")
+        text = template.safe_substitute(site=html.escape(self.site), sections=sections.getvalue())
+        self.write(Util.join([self.out_dir, "index.html"]), text)
+
+    # the output reflects only the current base: pages of removed items and categories are deleted
+    def remove_stale(self):
+        hooks = set(x.hook for x in self.item_rep.itens)
+        for name in sorted(os.listdir(self.out_dir)):
+            path = Util.join([self.out_dir, name])
+            if name in hooks or name in ["category", "sprites"] or name.startswith(".") or not os.path.isdir(path):
+                continue
+            if os.path.isfile(Util.join([path, "index.html"])):
+                print("  removing", path)
+                Journal.watch_tree(path)
+                rmtree(path)
+        pages = set(self.item_rep.cat_labels.get_label(key).key + ".html" for key, _itens in self.item_rep.cats)
+        for folder, keep in [("category", pages), ("sprites", self.sprites)]:
+            folder = Util.join([self.out_dir, folder])
+            if not os.path.isdir(folder):
+                continue
+            for name in sorted(os.listdir(folder)):
+                if name not in keep:
+                    print("  removing", Util.join([folder, name]))
+                    Journal.watch(Util.join([folder, name]))
+                    os.remove(Util.join([folder, name]))
+        pages = set(Util.join([self.out_dir, x, "index.html"]) for x in hooks)
+        self.state = {x: y for x, y in self.state.items() if x in pages}
+
+    def generate(self):
+        for item in sorted(self.item_rep.itens, key=lambda x: x.hook):
+            self.render_item(item)
+        self.render_categories()
+        self.render_index()
+        self.remove_stale()
+        self.write(self.state_path, json.dumps(self.state, indent=2, sort_keys=True))
+
+
+class Compress:
+    # writes .gz (and .br, if the brotli module is installed) siblings of text outputs
+    # a sibling gets the mtime of its source, so it's remade only when the source changes
+    EXTENSIONS = [".html", ".md", ".json", ".xml", ".txt", ".css", ".js", ".svg", ".csv"]
+
+    @staticmethod
+    def collect(paths           , extensions           , min_size     )             :
+        files = []
+        for path in paths:
+            if os.path.isfile(path):
+                files.append(Util.normpath(path))
+                continue
+            for (root, _dirs, names) in os.walk(path):
+                files += [Util.join([root, x]) for x in names if not x.startswith(".")]
+        return sorted(x for x in set(files) if os.path.splitext(x)[1].lower() in extensions
+                      and os.path.getsize(x) >= min_size)
+
+    # siblings whose source was removed or is no longer eligible, and every .br when brotli is off
+    # only names like page.html.gz are ours, other archives (data.tar.gz) are left alone
+    @staticmethod
+    def remove_stale(paths           , files           , extensions           , use_brotli      ):
+        eligible = set(files)
+        siblings = []
+        for path in paths:
+            if os.path.isdir(path):
+                for (root, _dirs, names) in os.walk(path):
+                    siblings += [Util.join([root, x]) for x in names if x.endswith(".gz") or x.endswith(".br")]
+            else:
+                siblings += [x for x in [path + ".gz", path + ".br"] if os.path.isfile(x)]
+        for sibling in sorted(siblings):
+            source = sibling[:-3]
+            if os.path.splitext(source)[1].lower() not in extensions:
+                continue
+            if source not in eligible or (sibling.endswith(".br") and not use_brotli):
+                print("  removing", sibling)
+                Journal.watch(sibling)
+                os.remove(sibling)
+
+    @staticmethod
+    def make(source     , use_brotli      )            :
+        mtime = os.path.getmtime(source)
+        targets = [(source + ".gz", lambda data: gzip.compress(data, 9, mtime=0))]
+        if use_brotli:
+            targets.append((source + ".br", lambda data: brotli.compress(data, quality=11)))
+        done = []
+        data = None
+        for target, compress in targets:
+            if os.path.isfile(target) and os.path.getmtime(target) == mtime:
+                continue
+            if data is None:
+                with open(source, "rb") as f:
+                    data = f.read()
+            Journal.watch(target)
+            with open(target, "wb") as f:
+                f.write(compress(data))
+            os.utime(target, (mtime, mtime))
+            done.append(target)
+        return done
+
+    @staticmethod
+    def generate(paths           , extensions           , min_size     , use_brotli      , jobs     ):
+        if use_brotli and brotli is None:
+            print("  warning: brotli module not installed, writing only .gz")
+            use_brotli = False
+        files = Compress.collect(paths, extensions, min_size)
+        Compress.remove_stale(paths, files, extensions, use_brotli)
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            for done in pool.map(lambda x: Compress.make(x, use_brotli), files):
+                for target in done:
+                    print("  compressed", target)
+
+
+class Checker:
+    # validates the relative links and images of markdown files
+    # the targets found in each file are cached by its content hash, only their existence is checked again
+    VERSION = 3  # bump when the extraction changes, so cached targets are parsed again
+    TARGET = r"\(\s*(?:<([^>]*)>|([^)\s]*))(?:\s+\"[^\"]*\")?\s*\)"  # <my file.png> or bare path
+    LINK = re.compile(r"\[[^\[\]]*\]" + TARGET)
+    OUTER_LINK = re.compile(r"\[(?:[^\[\]]|\[[^\[\]]*\])*\]" + TARGET)  # [![](img)](target)
+    IMG = re.compile(r"<img\s[^>]*?src=\"([^\"]*)\"", re.IGNORECASE)
+
+    def __init__(self, cache_file     ):
+        self.cache_file = cache_file
+        self.cache = {}
+        if os.path.isfile(cache_file):
+            with open(cache_file, "r") as f:
+                self.cache = json.load(f)
+
+    @staticmethod
+    def is_local(target     )        :
+        if target == "" or target.startswith("#") or target.startswith("/"):
+            return False
+        return re.match(r"^[a-zA-Z][\w+.-]*:", target) is None
+
+    @staticmethod
+    def get_targets(text     )            :
+        links = Checker.LINK.findall(text) + Checker.OUTER_LINK.findall(text)
+        targets = [x or y for x, y in links] + Checker.IMG.findall(text)
+        targets = [urllib.parse.unquote(re.split(r"[#?]", x)[0]) for x in targets if Checker.is_local(x)]
+        return sorted(set(x for x in targets if x))
+
+    def check_file(self, path     )                                   :
+        with open(path, "rb") as f:
+            data = f.read()
+        sha1 = hashlib.sha1(data).hexdigest()
+        entry = self.cache.get(path)
+        if entry and entry["sha1"] == sha1 and entry.get("version") == Checker.VERSION:
+            targets = entry["targets"]
+        else:
+            targets = Checker.get_targets(data.decode("utf-8", errors="replace"))
+        root = os.path.dirname(path)
+        problems = [x for x in targets if not os.path.exists(Util.join([root, x]) if root else x)]
+        return path, {"sha1": sha1, "version": Checker.VERSION, "targets": targets}, problems
+
+    @staticmethod
+    def collect(paths           )             :
+        files = []
+        for path in paths:
+            if os.path.isdir(path):
+                for (root, _dirs, names) in os.walk(path):
+                    files += [Util.join([root, x]) for x in names if x.endswith(".md")]
+            elif os.path.isfile(path):
+                files.append(Util.normpath(path))
+            else:
+                print("  warning: nothing to check in", path)
+        return sorted(set(files))
+
+    # return the number of problems found
+    def generate(self, paths           , jobs     )       :
+        files = Checker.collect(paths)
+        problems = []
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            for path, entry, missing in pool.map(self.check_file, files):
+                self.cache[path] = entry
+                problems += [(path, x) for x in missing]
+        self.cache = {x: self.cache[x] for x in files}
+        Util.create_dirs_if_needed(self.cache_file)
+        Journal.watch(self.cache_file)
+        with open(self.cache_file, "w") as f:
+            f.write(json.dumps(self.cache, indent=2, sort_keys=True))
+        for path, target in problems:
+            print("  error: broken reference in", path, "->", target)
+        print("  checked", len(files), "files,", len(problems), "problems")
+        return len(problems)
+
+
+class Scripts:
+    # runs the cmds of the run action
+    # a cmd is a list, always executed, or {"cmd": [...], "inputs": [globs], "outputs": [paths]},
+    # skipped when the hash of its inputs matches the last successful run and its outputs exist
+    STATE = Util.join([".indexer", "run_cache.json"])
+
+    def __init__(self, rebuild_all      , jobs     ):
+        self.rebuild_all = rebuild_all
+        self.jobs = jobs
+        self.state = {}
+        if os.path.isfile(Scripts.STATE):
+            with open(Scripts.STATE, "r") as f:
+                self.state = json.load(f)
+
+    @staticmethod
+    def normalize(entry                  )                  :
+        if type(entry) is list:
+            return {"cmd": entry, "inputs": None, "outputs": []}
+        return Config.check_and_merge(entry, ["cmd"], {"inputs": None, "outputs": []})
+
+    @staticmethod
+    def get_signature(entry                )       :
+        files = set()
+        for pattern in entry["inputs"]:
+            files.update(x for x in glob.glob(pattern, recursive=True) if os.path.isfile(x))
+        h = hashlib.sha1(json.dumps(entry["cmd"]).encode())
+        for file in sorted(files):
+            h.update(file.encode() + b"\x00" + Util.file_hash(file).encode())
+        return h.hexdigest()
+
+    # an output path touches a glob if it matches it, or if one of them is a folder holding the other
+    # e.g. "build" and "build/**/*.html", or "out/a.html" and "out/**/*.html"
+    @staticmethod
+    def overlaps(path     , pattern     )        :
+        path = Util.normpath(path)
+        pattern = Util.normpath(pattern)
+        if fnmatch.fnmatch(path, pattern):
+            return True
+        literal = re.split(r"[*?\[]", pattern)[0]
+        if literal != pattern:  # glob, keep the folder before the first wildcard
+            literal = literal[:literal.rfind(os.sep) + 1].rstrip(os.sep)
+        if literal in ["", "."] or literal == path:
+            return True
+        return literal.startswith(path + os.sep) or path.startswith(literal + os.sep)
+
+    # b must wait for a if one writes what the other reads or writes
+    @staticmethod
+    def depends(a                , b                )        :
+        if a["inputs"] is None or b["inputs"] is None:
+            return True
+        for out in a["outputs"]:
+            if any(Scripts.overlaps(out, x) for x in b["inputs"] + b["outputs"]):
+                return True
+        for out in b["outputs"]:
+            if any(Scripts.overlaps(out, x) for x in a["inputs"]):
+                return True
+        return False
+
+    # group cmds in waves of independent cmds, keeping the order between dependent ones
+    @staticmethod
+    def get_waves(entries                      )                            :
+        waves = []
+        for entry in entries:
+            if waves and not any(Scripts.depends(x, entry) for x in waves[-1]):
+                waves[-1].append(entry)
+            else:
+                waves.append([entry])
+        return waves
+
+    def run_entry(self, entry                ):
+        key = json.dumps(entry["cmd"])
+        signature = None
+        if entry["inputs"] is not None:
+            signature = Scripts.get_signature(entry)
+            outputs_ok = all(os.path.exists(x) for x in entry["outputs"])
+            if not self.rebuild_all and self.state.get(key) == signature and outputs_ok:
+                print("  skipping, inputs unchanged: " + " ".join(entry["cmd"]))
+                return
+        print("$ " + " ".join(entry["cmd"]))
+        for output in entry["outputs"]:
+            Journal.watch(output)
+            Journal.watch_tree(output)
+        result = subprocess.run(entry["cmd"])
+        for output in entry["outputs"]:
+            Journal.watch_new(output)
+        if signature is None:
+            return
+        if result.returncode == 0:
+            self.state[key] = signature
+        else:
+            self.state.pop(key, None)
+
+    def run(self, cmds                              ):
+        entries = [Scripts.normalize(x) for x in cmds]
+        for wave in Scripts.get_waves(entries):
+            if len(wave) == 1:
+                self.run_entry(wave[0])
+                continue
+            with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+                list(pool.map(self.run_entry, wave))
+        Util.create_dirs_if_needed(Scripts.STATE)
+        Journal.watch(Scripts.STATE)
+        with open(Scripts.STATE, "w") as f:
+            f.write(json.dumps(self.state, indent=2, sort_keys=True))
+
+
 class Main:
     #ctions: Dict[str, Callable[[ItemRepository, Dict[str, Any], Any], ItemRepository]]
 
-    def __init__(self):
+    def __init__(self, cache                 = None):
         self.actions = {}
+        self.cache = cache
+        self.changes = Changes()
+        self.timings                          = []
+        self.outputs            = []  # generated files and dirs, validated by the check action
         self.load_modules()
 
     def add_action(self, key     , fn                                                                 )        :
@@ -829,6 +2019,7 @@ class Main:
     @staticmethod
     def save_file(intro, out_file, text):
         out_file = os.path.normpath(out_file)
+        Journal.watch(out_file)
         if intro:
             intro = os.path.normpath(intro)
             if not os.path.isfile(intro):
@@ -842,10 +2033,14 @@ class Main:
                 f.write(text)
 
     def load_modules(self):
-        def load_folder(_item_rep, options, _args):
+        def load_folder(_item_rep, options, args):
             print("Loading folder")
-            Config.check_and_merge(options, ["action", "dir"])
-            item_rep = ItemRepository(options["dir"])
+            op = Config.check_and_merge(options, ["action", "dir"], {"strict": True})
+            item_rep = ItemRepository(op["dir"], op["strict"])
+            if args.git:
+                self.changes = Changes.from_git(item_rep.base, args.r)
+            else:
+                self.changes = Changes(args.r)
             return item_rep
         self.add_action("load_folder", load_folder)
 
@@ -854,23 +2049,23 @@ class Main:
             optional = {"sort_by": "categories", "reverse_sort": False}
             op = Config.check_and_merge(options, ["action", "file"], optional)
             Board.generate(item_rep, op["file"], op["sort_by"], op["reverse_sort"])
+            self.outputs.append(op["file"])
             return item_rep
         self.add_action("board", make_board)
 
-        def run_scripts(item_rep, options, _args):
+        def run_scripts(item_rep, options, args):
             print("Running Scripts")
-            Config.check_and_merge(options, ["action", "cmds"])
-            for cmd in options["cmds"]:
-                print(cmd)
-                print("$ " + " ".join(cmd))
-                subprocess.run(cmd)
+            op = Config.check_and_merge(options, ["action", "cmds"], {"jobs": os.cpu_count()})
+            Scripts(args.r, int(op["jobs"])).run(op["cmds"])
             return item_rep
         self.add_action("run", run_scripts)
 
         def make_thumbs(item_rep, options, args):
             print("Generating thumbs")
-            Config.check_and_merge(options, ["action", "width", "height"])
-            Thumbs.generate(item_rep, int(options["width"]), int(options["height"]), args.r)
+            default = {"placeholder": "color", "sprites": False}
+            op = Config.check_and_merge(options, ["action", "width", "height"], default)
+            Thumbs.generate(item_rep, int(op["width"]), int(op["height"]), self.changes, op["placeholder"], self.cache,
+                            op["sprites"])
             return item_rep
         self.add_action("thumbs", make_thumbs)
 
@@ -878,6 +2073,7 @@ class Main:
             print("Generating links")
             Config.check_and_merge(options, ["action", "dir"])
             Links.generate(item_rep, options["dir"])
+            self.outputs.append(options["dir"])
             return item_rep
         self.add_action("links", make_links)
 
@@ -887,6 +2083,7 @@ class Main:
             op = Config.check_and_merge(options, ["action", "file"], default)
             text = Index.generate(item_rep, op["file"], op["group_by"], op["reverse_sort"])
             Main.save_file(op["intro"], op["file"], text)
+            self.outputs.append(op["file"])
             return item_rep
         self.add_action("index", make_index)
 
@@ -902,17 +2099,23 @@ class Main:
         def make_view(item_rep, options, _args):
             print("Generating photo board")
             d = {"intro": None, "group_by": "categories", "reverse_sort": False,
-                 "posts_per_row": 4, "empty_fig": None}
+                 "posts_per_row": 4, "empty_fig": None, "css_sprites": False}
             op = Config.check_and_merge(options, ["action", "file"], d)
+            if op["css_sprites"]:
+                print("  warning: css_sprites needs a renderer keeping inline styles (jekyll, html), "
+                      "GitHub shows them as empty links")
             text = View.generate(item_rep, op["file"], op["group_by"], op["reverse_sort"], op["empty_fig"],
-                                 op["posts_per_row"])
+                                 op["posts_per_row"], op["css_sprites"])
             Main.save_file(op["intro"], op["file"], text)
+            self.outputs.append(op["file"])
             return item_rep
         self.add_action("view", make_view)
         
         def make_posts(item_rep, options, args):
             print("Generating posts")
-            default = {"default_date": None}
+            default = {"default_date": None, "assets_dir": None, "assets_remote": None,
+                       "lite_videos": False, "posters_dir": None, "posters_remote": None,
+                       "jobs": 1 if args.projects else os.cpu_count()}  # --projects already runs a process per site
             op = Config.check_and_merge(options, ["action", "dir", "default_date", "base_raw_remote", "categories_dir",
                                                   "file_linker"], default)
             posts_dir = op["dir"]
@@ -920,40 +2123,147 @@ class Main:
             remote = op["base_raw_remote"]
             categories_dir = op["categories_dir"]
             file_linker = op["file_linker"]
-            Posts.generate(item_rep, posts_dir, date, remote, categories_dir, file_linker, args.r)
+            assets = None
+            if op["assets_dir"]:
+                assets_remote = op["assets_remote"] if op["assets_remote"] else "/" + op["assets_dir"]
+                assets = Fingerprint(op["assets_dir"], assets_remote)
+            videos = None
+            if op["lite_videos"]:
+                videos = VideoFacade(op["posters_dir"], op["posters_remote"])
+            Posts.generate(item_rep, posts_dir, date, remote, categories_dir, file_linker, self.changes, assets,
+                           videos, int(op["jobs"]))
             return item_rep
         self.add_action("posts", make_posts)
 
+        def make_html(item_rep, options, _args):
+            print("Generating html")
+            default = {"site": "Site", "templates": {}, "css_sprites": False}
+            op = Config.check_and_merge(options, ["action", "dir"], default)
+            HtmlSite(item_rep, op["dir"], op["site"], op["templates"], op["css_sprites"]).generate()
+            return item_rep
+        self.add_action("html", make_html)
+
+        def make_compress(item_rep, options, _args):
+            print("Compressing outputs")
+            default = {"extensions": Compress.EXTENSIONS, "min_size": 1024, "brotli": brotli is not None, "jobs": os.cpu_count()}
+            op = Config.check_and_merge(options, ["action", "paths"], default)
+            Compress.generate(op["paths"], op["extensions"], int(op["min_size"]), op["brotli"], int(op["jobs"]))
+            return item_rep
+        self.add_action("compress", make_compress)
+
+        def make_check(item_rep, options, _args):
+            print("Checking links")
+            default = {"files": [], "jobs": os.cpu_count(), "cache": Util.join([".indexer", "check_cache.json"]),
+                       "fail": True}
+            op = Config.check_and_merge(options, ["action"], default)
+            paths = [x.path_full for x in item_rep.itens] + self.outputs + op["files"]
+            problems = Checker(op["cache"]).generate(paths, int(op["jobs"]))
+            if problems and op["fail"]:
+                exit(1)
+            return item_rep
+        self.add_action("check", make_check)
+
     def execute_actions(self, options                , item_rep                , args):
         for key in self.actions:
             if key == options["action"]:
+                start = time.perf_counter()
+                Journal.action = key
                 item_rep = self.actions[key](item_rep, options, args)
+                self.timings.append((key, time.perf_counter() - start))
                 return item_rep
 
         print("  error: action", options["action"], "not found")
         print("  you need choose one of this actions:")
         print("  ", self.actions.keys())
 
+    # run the pipeline of the project in the current dir
+    def run(self, args):
+        cfg = Config.load_cfg(".indexer.json")
+        Config.check_and_merge(cfg, ["execute"])
+        Journal.start()
+        if args.b:
+            self.update_from_board(args.b)
+        item_rep = None
+        for options in cfg["execute"]:
+            item_rep = self.execute_actions(options, item_rep, args)
+        if args.git:
+            self.changes.save_build()
+        Journal.save(Journal.MANIFEST)
+        return self.timings
+
+
+class Batch:
+    # worker entry point, runs in its own process so changing the cwd is safe
+    @staticmethod
+    def build_project(root     , args)                                     :
+        os.chdir(root)
+        print("Building", root)
+        cache = Cache(args.cache) if args.cache else None
+        try:
+            return Main(cache).run(args), True
+        except SystemExit as e:
+            print("  error: build of", root, "stopped with exit code", e.code)
+            return [], False
+        except Exception as e:
+            print("  error: build of", root, "failed:", repr(e))
+            return [], False
+
+    @staticmethod
+    def run(roots           , args, jobs     ):
+        roots = [os.path.abspath(x) for x in roots]
+        for root in roots:
+            if not os.path.isfile(Util.join([root, ".indexer.json"])):
+                print("  fail: .indexer.json not found in", root)
+                exit(1)
+        results = {}
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = {root: pool.submit(Batch.build_project, root, args) for root in roots}
+            for root in roots:
+                results[root] = futures[root].result()
+        Batch.report(results, time.perf_counter() - start)
+        return all(ok for _timings, ok in results.values())
+
+    @staticmethod
+    def report(results                                                 , wall       ):
+        totals                   = {}
+        print("\nTiming report")
+        for root, (timings, ok) in results.items():
+            project_total = sum(t for _key, t in timings)
+            status = "ok" if ok else "FAILED"
+            print("  %8.2fs  %-6s %s" % (project_total, status, root))
+            for key, t in timings:
+                totals[key] = totals.get(key, 0.0) + t
+        print("  by action:")
+        for key, t in sorted(totals.items(), key=lambda x: -x[1]):
+            print("  %8.2fs  %s" % (t, key))
+        print("  %8.2fs  wall time for %d projects" % (wall, len(results)))
+
 
 def main():
     parser = argparse.ArgumentParser(prog='indexer.py')
     parser.add_argument('-b', action='store', help='set titles using board')
     parser.add_argument('-r', action='store_true', help='rebuild all')
+    parser.add_argument('--git', action='store_true', help='detect changes with git instead of mtimes')
     parser.add_argument('--init', action='store_true', help='show .indexer.json default')
+    parser.add_argument('--projects', nargs='+', metavar='DIR', help='build many project roots in one run')
+    parser.add_argument('-j', type=int, default=os.cpu_count(), help='workers used by --projects')
+    parser.add_argument('--cache', action='store', help='shared cache dir for thumbs and image info')
     args = parser.parse_args()
 
-    indexer = Main()
+    if args.projects:
+        if args.cache is None:
+            args.cache = Util.join([os.path.expanduser("~"), ".cache", "indexer"])
+        if not Batch.run(args.projects, args, args.j):
+            exit(1)
+        print("All done!")
+        return
+
+    indexer = Main(Cache(args.cache) if args.cache else None)
     if args.init:
         indexer.init_json()
 
-    cfg = Config.load_cfg(".indexer.json")
-    Config.check_and_merge(cfg, ["execute"])
-    if args.b:
-        indexer.update_from_board(args.b)
-    item_rep = None
-    for options in cfg["execute"]:
-        item_rep = indexer.execute_actions(options, item_rep, args)
-        
+    indexer.run(args)
     print("All done!")
 
 